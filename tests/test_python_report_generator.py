@@ -1,12 +1,21 @@
 """Tests for python_report_generator.py"""
 import ast
+import os
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from typing import List, Tuple
 
 import pytest
 from pytest import CaptureFixture, MonkeyPatch
 
+from python_code_outline import python_report_generator
 from python_code_outline.python_report_generator import (
+    compile_ignore_patterns,
     expand_user_path,
+    find_python_files,
     generate_report,
     get_report,
     is_ignored,
@@ -43,24 +52,79 @@ def fixture_sample_directory(tmp_path: Path) -> Path:
 def test_parse_ignore_patterns(sample_ignore_file: str) -> None:
     """Test that the ignore patterns are parsed correctly."""
     patterns = parse_ignore_patterns(sample_ignore_file)
-    assert patterns == ["*.txt", "*.log"]
+    assert patterns == ("*.txt", "*.log")
+
+
+def test_parse_ignore_patterns_file_changed(sample_ignore_file: Path) -> None:
+    """Test that cached patterns are re-read once the ignore file changes."""
+    assert parse_ignore_patterns(str(sample_ignore_file)) == ("*.txt", "*.log")
+    sample_ignore_file.write_text("build/\n")
+    stat = sample_ignore_file.stat()
+    os.utime(sample_ignore_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert parse_ignore_patterns(str(sample_ignore_file)) == ("build/",)
 
 
 def test_is_ignored(sample_directory: Path) -> None:
     """Test that the ignore patterns are parsed correctly."""
-    ignored_patterns = ["*.txt", "*.log"]
-    assert is_ignored(sample_directory / "file1.py", ignored_patterns) is False
-    assert is_ignored(sample_directory / "file2.py", ignored_patterns) is False
+    ignore_matcher = compile_ignore_patterns(("*.txt", "*.log"))
+    for name in ("file1.py", "file2.py"):
+        posix = (sample_directory / name).as_posix()
+        assert is_ignored(name, posix, ignore_matcher) is False
+    notes = sample_directory / "notes.txt"
+    assert is_ignored("notes.txt", notes.as_posix(), ignore_matcher) is True
+
+
+def test_is_ignored_path_patterns(sample_directory: Path) -> None:
+    """Test that patterns match names, or path endings when they contain a slash."""
+    ignore_matcher = compile_ignore_patterns(("build/", "docs/*.py", "*tmp*"))
+    build = sample_directory / "build"
+    conf = sample_directory / "docs" / "conf.py"
+    file1 = sample_directory / "file1.py"
+    assert is_ignored("build", build.as_posix(), ignore_matcher) is True
+    assert is_ignored("conf.py", conf.as_posix(), ignore_matcher) is True
+    assert is_ignored("file1.py", file1.as_posix(), ignore_matcher) is False
+    nested = sample_directory / "docs" / "sub" / "conf.py"
+    assert is_ignored("conf.py", nested.as_posix(), ignore_matcher) is False
+    assert is_ignored(".gitignore", "/.gitignore", ((), None, None)) is True
+
+
+def test_is_ignored_empty_bracket_ranges(sample_directory: Path) -> None:
+    """Test that reversed or empty bracket ranges match nothing, like fnmatch."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        ignore_matcher = compile_ignore_patterns(("docs/[z-a].py", "docs/[a--]x"))
+    for name in ("a.py", "z.py", "ax", "-x"):
+        path = (sample_directory / "docs" / name).as_posix()
+        assert is_ignored(name, path, ignore_matcher) is False
+
+    (sample_directory / "docs").mkdir()
+    (sample_directory / "docs" / "a.py").write_text("import os\n")
+    ignore_file = sample_directory / "ignore.txt"
+    ignore_file.write_text("docs/[z-a].py\n")
+    report = get_report(str(sample_directory), str(ignore_file))
+    assert report.startswith("- docs/a.py\nimports os")
+
+
+def test_compile_ignore_patterns() -> None:
+    """Test that extension patterns are split from the general patterns."""
+    suffixes, name_regex, path_regex = compile_ignore_patterns(
+        ("*.pyc", "*.log", "b*.py", "test_*")
+    )
+    assert suffixes == (".pyc", ".log")
+    assert name_regex is not None
+    assert name_regex.match("build.py") and name_regex.match("test_main.py")
+    assert not name_regex.match("main.py")
+    assert path_regex is None
 
 
 def test_list_entries(sample_directory: Path) -> None:
     """Test that the entries are listed correctly."""
     entries = list_entries(str(sample_directory))
-    assert entries == [
-        sample_directory / "folder1",
-        sample_directory / "folder2",
+    assert sorted(Path(entry.path) for entry in entries) == [
         sample_directory / "file1.py",
         sample_directory / "file2.py",
+        sample_directory / "folder1",
+        sample_directory / "folder2",
     ]
 
 
@@ -90,7 +154,9 @@ def example_function(arg1, arg2):
     node = ast.parse(code)
     item = node.body[0]
     assert isinstance(item, ast.FunctionDef)
-    assert process_function_def(item) == [
+    output: List[str] = []
+    process_function_def(item, output)
+    assert output == [
         "fn example_function(arg1, arg2)",
         "\tvar var1",
         "\tvar var2",
@@ -107,13 +173,32 @@ class ExampleClass:
     node = ast.parse(code)
     item = node.body[0]
     assert isinstance(item, ast.ClassDef)
-    assert process_class_def(item) == [
+    output: List[str] = []
+    process_class_def(item, output)
+    assert output == [
         "cls ExampleClass()",
         "\tfn method1(self, arg1)",
         "\t\tvar var1",
     ]
 
 
+def test_process_class_def_indent() -> None:
+    """Test that a class definition is appended after existing output, indented."""
+    node = ast.parse(
+        "class ExampleClass(Base):\n    def method1(self):\n        var1 = 1"
+    )
+    item = node.body[0]
+    assert isinstance(item, ast.ClassDef)
+    output = ["- file.py"]
+    process_class_def(item, output, "\t")
+    assert output == [
+        "- file.py",
+        "\tcls ExampleClass(Base)",
+        "\t\tfn method1(self)",
+        "\t\t\tvar var1",
+    ]
+
+
 def test_process_python_file(sample_directory: Path) -> None:
     """Test that the python file is processed correctly."""
     file_path = sample_directory / "file1.py"
@@ -121,6 +206,102 @@ def test_process_python_file(sample_directory: Path) -> None:
     assert report == "- file1.py\nimports os"
 
 
+def test_process_python_file_encoding_cookie(sample_directory: Path) -> None:
+    """Test that a file's declared source encoding is honoured."""
+    file_path = sample_directory / "latin1.py"
+    file_path.write_bytes(b"# -*- coding: latin-1 -*-\ndef caf\xe9(arg1):\n    pass\n")
+    report = process_python_file(file_path, sample_directory)
+    assert report == "- latin1.py\nfn caf\u00e9(arg1)"
+
+
+def test_process_python_file_large(sample_directory: Path) -> None:
+    """Test that files above the small-file size are read in full."""
+    file_path = sample_directory / "large.py"
+    padding = "# padding\n" * (python_report_generator.SMALL_FILE_SIZE // 10)
+    file_path.write_text(f"import os\n{padding}def last(arg1):\n    pass\n")
+    report = process_python_file(file_path, sample_directory)
+    assert report == "- large.py\nimports os\nfn last(arg1)"
+
+
+def test_process_python_file_short_reads(
+    sample_directory: Path, monkeypatch: MonkeyPatch
+) -> None:
+    """Test that small files are read in full even when os.read returns less."""
+    real_read = os.read
+    monkeypatch.setattr(os, "read", lambda descriptor, _: real_read(descriptor, 3))
+    file_path = sample_directory / "file_with_function.py"
+    file_path.write_text("def example_function(arg1, arg2):\n    pass\n")
+    report = process_python_file(file_path, sample_directory)
+    assert report == "- file_with_function.py\nfn example_function(arg1, arg2)"
+
+
+def test_process_python_file_relative_path(sample_directory: Path) -> None:
+    """Test that nested files are reported relative to the root folder."""
+    file_path = sample_directory / "folder1" / "inner.py"
+    file_path.write_text("import json\n")
+    report = process_python_file(file_path, sample_directory)
+    assert report == "- folder1/inner.py\nimports json"
+    report = generate_report(str(sample_directory / "folder1"), str(sample_directory))
+    assert report == "- folder1/inner.py\nimports json"
+
+
+def test_process_python_file_cached(
+    sample_directory: Path, monkeypatch: MonkeyPatch
+) -> None:
+    """Test that unchanged files reuse their report and changed files do not."""
+    file_path = sample_directory / "file1.py"
+    assert process_python_file(file_path, sample_directory) == "- file1.py\nimports os"
+
+    def fail_outline(*_: object) -> str:
+        raise AssertionError("unchanged file was parsed again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(python_report_generator, "_outline_python_file", fail_outline)
+        report = process_python_file(file_path, sample_directory)
+        assert report == "- file1.py\nimports os"
+
+    file_path.write_text("import os, sys\n")
+    report = process_python_file(file_path, sample_directory)
+    assert report == "- file1.py\nimports os, sys"
+
+
+def test_process_python_file_cache_size(
+    sample_directory: Path, monkeypatch: MonkeyPatch
+) -> None:
+    """Test that the report cache evicts its least recently used entries."""
+    report_cache: OrderedDict[Tuple[str, str], object] = OrderedDict()
+    monkeypatch.setattr(python_report_generator, "_REPORT_CACHE", report_cache)
+    monkeypatch.setattr(python_report_generator, "REPORT_CACHE_SIZE", 2)
+    for name in ("file1.py", "file2.py", "file1.py", "file3.py"):
+        (sample_directory / name).write_text("import os\n")
+        process_python_file(sample_directory / name, sample_directory)
+    assert list(report_cache) == [
+        (str(sample_directory / "file1.py"), str(sample_directory)),
+        (str(sample_directory / "file3.py"), str(sample_directory)),
+    ]
+
+
+def test_process_python_file_cache_threads(
+    sample_directory: Path, monkeypatch: MonkeyPatch
+) -> None:
+    """Test that concurrent lookups and evictions leave the cache consistent."""
+    monkeypatch.setattr(python_report_generator, "REPORT_CACHE_SIZE", 2)
+    paths = []
+    for index in range(6):
+        paths.append(sample_directory / f"module{index}.py")
+        paths[-1].write_text(f"import mod{index}\n")
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        reports = list(
+            executor.map(
+                lambda path: process_python_file(path, sample_directory), paths * 50
+            )
+        )
+    assert reports[:6] == [
+        f"- module{index}.py\nimports mod{index}" for index in range(6)
+    ]
+
+
 def test_generate_report(sample_directory: Path, sample_ignore_file: Path) -> None:
     """Test that the report is generated correctly."""
     ignored_patterns = parse_ignore_patterns(str(sample_ignore_file))
@@ -140,7 +321,9 @@ def example_function(arg1, arg2):
     node = ast.parse(code)
     item = node.body[0]
     assert isinstance(item, ast.FunctionDef)
-    assert process_function_def(item) == [
+    output: List[str] = []
+    process_function_def(item, output)
+    assert output == [
         "fn example_function(arg1, arg2)",
     ]
 
@@ -154,7 +337,9 @@ class ExampleClass:
     node = ast.parse(code)
     item = node.body[0]
     assert isinstance(item, ast.ClassDef)
-    assert process_class_def(item) == [
+    output: List[str] = []
+    process_class_def(item, output)
+    assert output == [
         "cls ExampleClass()",
     ]
 
@@ -275,6 +460,83 @@ def test_generate_report_with_subdir(sample_directory: Path) -> None:
         assert part in report
 
 
+def test_generate_report_order(sample_directory: Path) -> None:
+    """Test that folders are reported before files, depth first, by name."""
+    (sample_directory / "folder1" / "inner.py").write_text("import json\n")
+    (sample_directory / "folder2" / "nested").mkdir()
+    (sample_directory / "folder2" / "nested" / "deep.py").write_text("import re\n")
+    (sample_directory / "folder2" / "Other.py").write_text("import sys\n")
+    report = generate_report(str(sample_directory), str(sample_directory))
+    assert [part.split("\n")[0] for part in report.split("\n\n")] == [
+        "- folder1/inner.py",
+        "- folder2/nested/deep.py",
+        "- folder2/Other.py",
+        "- file1.py",
+        "- file2.py",
+    ]
+
+
+def test_find_python_files(sample_directory: Path) -> None:
+    """Test that only non-ignored Python files are listed, in report order."""
+    (sample_directory / "folder1" / "inner.py").write_text("import json\n")
+    (sample_directory / "notes.txt").write_text("notes\n")
+    (sample_directory / "skip.py").write_text("import sys\n")
+    assert find_python_files(str(sample_directory), ("skip.py",)) == [
+        str(sample_directory / "folder1" / "inner.py"),
+        str(sample_directory / "file1.py"),
+        str(sample_directory / "file2.py"),
+    ]
+
+
+def test_find_python_files_pruned_dirs(sample_directory: Path) -> None:
+    """Test that well-known heavy folders are skipped without ignore patterns."""
+    for folder in ("node_modules", ".venv", "venv"):
+        (sample_directory / folder).mkdir()
+        (sample_directory / folder / "module.py").write_text("import os\n")
+    assert find_python_files(str(sample_directory), ()) == [
+        str(sample_directory / "venv" / "module.py"),
+        str(sample_directory / "file1.py"),
+        str(sample_directory / "file2.py"),
+    ]
+
+
+def test_generate_report_parallel(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that worker processes produce the same report as the serial path."""
+    # more files than the serial path's read-ahead window
+    for index in range(python_report_generator.READ_AHEAD_THREADS * 2 + 4):
+        (tmp_path / f"module{index:02}.py").write_text(f"import mod{index}\n")
+    with monkeypatch.context() as patch:
+        patch.setattr(python_report_generator, "PARALLEL_BYTES_PER_WORKER", 1)
+        report = generate_report(str(tmp_path), str(tmp_path), workers=2)
+
+    monkeypatch.setattr(python_report_generator, "_REPORT_CACHE", OrderedDict())
+    assert report == generate_report(str(tmp_path), str(tmp_path))
+    assert report.startswith("- module00.py\nimports mod0\n\n- module01.py")
+
+
+def test_generate_report_broken_pool(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that a pool whose workers cannot start falls back to the serial path."""
+
+    class BrokenExecutor:  # pylint: disable=too-few-public-methods
+        """Executor whose workers died while starting up."""
+
+        def __init__(self, max_workers: int) -> None:
+            self.max_workers = max_workers
+
+        def __enter__(self) -> "BrokenExecutor":
+            raise BrokenProcessPool("worker failed to start")
+
+        def __exit__(self, *_: object) -> None:
+            pass
+
+    for index in range(4):
+        (tmp_path / f"module{index}.py").write_text(f"import mod{index}\n")
+    monkeypatch.setattr(python_report_generator, "ProcessPoolExecutor", BrokenExecutor)
+    monkeypatch.setattr(python_report_generator, "PARALLEL_BYTES_PER_WORKER", 1)
+    report = generate_report(str(tmp_path), str(tmp_path), workers=2)
+    assert report.startswith("- module0.py\nimports mod0\n\n- module1.py")
+
+
 def test_main_invalid_directory(monkeypatch: MonkeyPatch) -> None:
     """Test main function with an invalid directory."""
     # Set command-line arguments